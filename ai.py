@@ -1,213 +1,263 @@
-import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
 from constants import *
+from ai_core import COLUMN_STRIDE, INFINITY, MAX_DEPTH, WIN_SCORE
+import ai_core
+from opening_book import get_book_move
+
+# Shallower searches finish too quickly to be worth sending to worker processes
+PARALLEL_MIN_DEPTH = 7
+
+# Seconds the worker processes may take to start before the search falls back to one process
+WORKER_START_TIMEOUT = 60
+
+# Connect4AI instance of a worker process, created by init_worker
+worker_ai = None
+
+
+def init_worker(ready) -> None:
+    """
+    Sets up a worker process of the root search pool with its own search tables, then waits
+    until every other worker is set up too, so the pool is ready once any of them runs a task.
+    :param ready: multiprocessing Barrier shared by all the workers of the pool.
+    :return: None
+    """
+    global worker_ai
+    worker_ai = Connect4AI(depth=MAX_DEPTH, workers=1)
+    ready.wait(WORKER_START_TIMEOUT)
+
+
+def search_move_in_worker(search_id, position, mask, heights, col, depth, alpha, deadline) -> int:
+    """
+    Searches one root move in a worker process. The worker's search tables are kept while the
+    same search (one get_best_move call) sends it more moves, and reset when a new one starts.
+    :param search_id: Identifier of the get_best_move call the move belongs to.
+    :param position: Bitboard of the AI's pieces at the root.
+    :param mask: Bitboard of all occupied cells at the root.
+    :param heights: Array holding the bit index of the next free cell in each column at the root.
+    :param col: Column of the root move to search.
+    :param depth: Search depth of the root.
+    :param alpha: Score the move has to beat to become the best move.
+    :param deadline: time.monotonic() value after which the search raises TimeoutError.
+    :return: The score of the move for the AI (at most alpha if it does not beat alpha).
+    """
+    if worker_ai.search_id != search_id:
+        worker_ai.reset_search_tables()
+        worker_ai.search_id = search_id
+    return worker_ai.search_move(position, mask, heights, col, depth, alpha, deadline)
+
 
 class Connect4AI:
     """
     Connect4AI class that implements the Minimax algorithm with alpha-beta pruning
     to determine the best move for the AI player in a Connect 4 game.
     It evaluates the game state and scores potential moves to find the optimal play.
-    This class can be used with any Connect 4-like board configuration, not just the standard one.
-    It provides methods to get valid moves, check for terminal states, evaluate board positions,
-    and find the best move using the Minimax algorithm.
+    The search itself lives in ai_core, compiled with Numba; this class converts the game
+    board to bitboards, keeps the search tables and runs the iterative deepening loop.
+    Deep searches can split the root moves over a pool of worker processes; call close() (or use
+    the AI as a context manager) to shut the pool down. Like any code starting processes, a script
+    creating such an AI needs an if __name__ == "__main__" guard.
     """
-    def __init__(self, depth=8) -> None:
+    def __init__(self, depth=8, workers=1, use_book=True) -> None:
         """
         Initializes the AI with a specified depth for the Minimax algorithm.
-        :param depth: The depth of the search tree for the Minimax algorithm.
+        :param depth: The maximum depth of the search tree for the Minimax algorithm.
+        :param workers: Number of processes searching root moves in parallel, or None for one per CPU.
+                        With 1, or when depth is below PARALLEL_MIN_DEPTH, the search runs in this process only.
+        :param use_book: Whether to play the opening book's move instead of searching when it has one.
         """
-        self.depth = depth
+        self.depth = min(depth, MAX_DEPTH)
+        self.use_book = use_book
+        self.search_id = 0
+        self.transposition_table = ai_core.new_transposition_table()
+        # One killer move (the last column that caused a beta cutoff) per remaining depth
+        self.killer_moves = np.full(self.depth + 1, -1, dtype=np.int64)
+        # Move list of the node being searched at each remaining depth, reused by every node
+        self.move_lists = np.zeros((self.depth + 1, BOARD_WIDTH), dtype=np.int64)
+        self.stats = np.zeros(1, dtype=np.int64)
 
-    def get_valid_moves(self, board) -> list:
+        # Compile (or load from the cache) the search now rather than during the first move
+        heights = np.arange(BOARD_WIDTH, dtype=np.int64) * COLUMN_STRIDE
+        ai_core.negamax(0, 0, heights, 1, -INFINITY, INFINITY, True,
+                        self.transposition_table, self.killer_moves, self.move_lists, self.stats, np.inf)
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.pool = None
+        if workers > 1 and self.depth >= PARALLEL_MIN_DEPTH:
+            workers = min(workers, BOARD_WIDTH)
+            # Spawned rather than forked workers, so they never inherit the GUI's state
+            context = multiprocessing.get_context("spawn")
+            self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                            initializer=init_worker, initargs=(context.Barrier(workers),))
+            # One task per worker starts them all, and none of the tasks runs before every worker
+            # is set up, so the first move's time budget is not spent waiting for them
+            started = [self.pool.submit(time.sleep, 0) for _ in range(workers)]
+            wait(started)
+            if any(future.exception() is not None for future in started):
+                self.close()
+
+    def __enter__(self) -> "Connect4AI":
         """
-        Returns a list of valid columns where a piece can be dropped in the current board state.
-        :param board: The current game board represented as a 2D list.
-        :return: A list of column indices where a piece can be dropped.
+        Returns the AI itself, so that the worker pool is shut down at the end of a with block.
+        :return: The Connect4AI instance.
         """
-        return [col for col in range(BOARD_WIDTH) if board[0][col] == EMPTY]
+        return self
 
-    def is_terminal_node(self, board) -> bool:
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
         """
-        Checks if the game is over, either by a win for either player or if the board is full.
-        :param board: The current game board represented as a 2D list.
-        :return: True if the game is over (win or draw), False otherwise.
+        Shuts the worker pool down when leaving a with block.
+        :return: None
         """
-        cond1 = self.winning_move(board, PLAYER_PIECE)
-        cond2 = self.winning_move(board, AI_PIECE)
-        cond3 = all(board[0][col] != EMPTY for col in range(BOARD_WIDTH))
-        return cond1 or cond2 or cond3
+        self.close()
 
-    def winning_move(self, board, piece) -> bool:
+    def close(self) -> None:
         """
-        Checks if the specified piece has a winning move on the given board.
-        :param board: The current game board represented as a 2D list.
-        :param piece: The piece to check for a winning move (PLAYER_PIECE or AI_PIECE).
-        :return: True if the piece has a winning move, False otherwise.
+        Shuts down the worker pool, if any. Later searches run in this process only.
+        :return: None
         """
-        # Same logic as Connect4 class but works on any board
-        for row in range(BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH - 3):
-                if all(board[row][col + i] == piece for i in range(WINDOW_LENGTH)):
-                    return True
-        for col in range(BOARD_WIDTH):
-            for row in range(BOARD_HEIGHT - 3):
-                if all(board[row + i][col] == piece for i in range(WINDOW_LENGTH)):
-                    return True
-        for row in range(BOARD_HEIGHT - 3):
-            for col in range(BOARD_WIDTH - 3):
-                if all(board[row + i][col + i] == piece for i in range(WINDOW_LENGTH)):
-                    return True
-        for row in range(3, BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH - 3):
-                if all(board[row - i][col + i] == piece for i in range(WINDOW_LENGTH)):
-                    return True
-        return False
-
-    def evaluate_window(self, window, piece) -> int:
-        """
-        Evaluates a window (a segment of the board) for scoring based on the presence of pieces.
-        :param window: A list representing a segment of the board (horizontal, vertical, or diagonal).
-        :param piece: The piece to evaluate (PLAYER_PIECE or AI_PIECE).
-        :return: An integer score for the window based on the pieces present.
-        """
-        opp_piece = PLAYER_PIECE if piece == AI_PIECE else AI_PIECE
-        score = 0
-
-        if window.count(piece) == 4:
-            score += 100
-        elif window.count(piece) == 3 and window.count(EMPTY) == 1:
-            score += 5
-        elif window.count(piece) == 2 and window.count(EMPTY) == 2:
-            score += 2
-
-        if window.count(opp_piece) == 3 and window.count(EMPTY) == 1:
-            score -= 4
-
-        return score
-
-    def score_position(self, board, piece) -> int:
-        """
-        Scores the current board position for the specified piece.
-        :param board: The current game board represented as a 2D list.
-        :param piece: The piece to score (PLAYER_PIECE or AI_PIECE).
-        :return: An integer score representing the board position for the piece.
-        """
-        score = 0
-
-        # Score center column
-        center_array = [board[row][BOARD_WIDTH // 2] for row in range(BOARD_HEIGHT)]
-        center_count = center_array.count(piece)
-        score += center_count * 3
-
-        # Score horizontal
-        for row in range(BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH - 3):
-                window = [board[row][col + i] for i in range(WINDOW_LENGTH)]
-                score += self.evaluate_window(window, piece)
-
-        # Score vertical
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def board_to_bitboards(self, board) -> tuple:
+        """
+        Converts a game board into the bitboard representation used by the search.
+        :param board: The current game board as a flat array stored row by row (row 0 is the top row).
+        :return: Tuple (position, mask, heights) where position holds the AI's pieces and heights is an array.
+        """
+        position, mask = 0, 0
+        heights = np.arange(BOARD_WIDTH, dtype=np.int64) * COLUMN_STRIDE
         for col in range(BOARD_WIDTH):
-            for row in range(BOARD_HEIGHT - 3):
-                window = [board[row + i][col] for i in range(WINDOW_LENGTH)]
-                score += self.evaluate_window(window, piece)
-
-        # Score diagonals
-        for row in range(BOARD_HEIGHT - 3):
-            for col in range(BOARD_WIDTH - 3):
-                window = [board[row + i][col + i] for i in range(WINDOW_LENGTH)]
-                score += self.evaluate_window(window, piece)
-
-        for row in range(BOARD_HEIGHT - 3):
-            for col in range(3, BOARD_WIDTH):
-                window = [board[row + i][col - i] for i in range(WINDOW_LENGTH)]
-                score += self.evaluate_window(window, piece)
-
-        return score
-
-    def minimax(self, board, depth, alpha, beta, maximizing_player) -> tuple:
-        """
-        The Minimax algorithm with alpha-beta pruning to find the best move for the AI.
-        :param board: 2D list representing the current game board state.
-        :param depth: Integer representing the remaining depth to explore in the game tree.
-        :param alpha: Best already explored option along the path to the root for the maximizer.
-        :param beta: Best already explored option along the path to the root for the minimizer.
-        :param maximizing_player: Boolean indicating whether the current turn is the AI's (True) or the player's (False).
-        :return: Tuple (best_column, score) — the column index to play and the corresponding score.
-        """
-        valid_moves = self.get_valid_moves(board)
-        is_terminal = self.is_terminal_node(board)
-
-        if depth == 0 or is_terminal:
-            if is_terminal:
-                if self.winning_move(board, AI_PIECE):
-                    return (None, 100000000)
-                elif self.winning_move(board, PLAYER_PIECE):
-                    return (None, -100000000)
-                else:
-                    return (None, 0)
-            else:
-                return (None, self.score_position(board, AI_PIECE))
-
-        if maximizing_player:
-            value = -math.inf
-            column = valid_moves[0]
-            for col in valid_moves:
-                row = self.get_next_open_row(board, col)
-                board_copy = board.copy()
-                self.drop_piece(board_copy, row, col, AI_PIECE)
-                new_score = self.minimax(board_copy, depth - 1, alpha, beta, False)[1]
-                if new_score > value:
-                    value = new_score
-                    column = col
-                alpha = max(alpha, value)
-                if alpha >= beta:
+            for row in range(BOARD_HEIGHT - 1, -1, -1):
+                cell = board[row * BOARD_WIDTH + col]
+                if cell == EMPTY:
                     break
-            return column, value
-
-        else:
-            value = math.inf
-            column = valid_moves[0]
-            for col in valid_moves:
-                row = self.get_next_open_row(board, col)
-                board_copy = board.copy()
-                self.drop_piece(board_copy, row, col, PLAYER_PIECE)
-                new_score = self.minimax(board_copy, depth - 1, alpha, beta, True)[1]
-                if new_score < value:
-                    value = new_score
-                    column = col
-                beta = min(beta, value)
-                if alpha >= beta:
-                    break
-            return column, value
+                bit = 1 << heights[col]
+                mask |= bit
+                if cell == AI_PIECE:
+                    position |= bit
+                heights[col] += 1
+        return position, mask, heights
 
-    def get_next_open_row(self, board, col) -> int:
+    def reset_search_tables(self) -> None:
         """
-        Finds the next available row in the specified column where a piece can be dropped.
-        :param board: 2D list representing the current game board state.
-        :param col: Integer representing the column to check for the next open row.
-        :return: Integer representing the row index of the next available spot, or -1 if the column is full.
+        Clears the transposition table, killer moves and node counter before a new search.
+        :return: None
         """
-        for row in range(BOARD_HEIGHT - 1, -1, -1):
-            if board[row][col] == EMPTY:
-                return row
-        return -1
+        ai_core.clear_transposition_table(self.transposition_table)
+        self.killer_moves.fill(-1)
+        self.stats.fill(0)
 
-    def drop_piece(self, board, row, col, piece) -> None:
+    def search_move(self, position, mask, heights, col, depth, alpha, deadline) -> int:
         """
-        Places a game piece in the specified location on the board.
-        :param board: 2D list representing the current game board state.
-        :param row: Integer representing the row index to place the piece.
-        :param col: Integer representing the column index to place the piece.
-        :param piece: Integer representing the piece (PLAYER_PIECE or AI_PIECE).
-        :return: None
+        Searches a single root move with the minimax algorithm.
+        :param position: Bitboard of the AI's pieces at the root.
+        :param mask: Bitboard of all occupied cells at the root.
+        :param heights: Array holding the bit index of the next free cell in each column at the root.
+        :param col: Column of the root move to search.
+        :param depth: Search depth of the root.
+        :param alpha: Score the move has to beat to become the best move.
+        :param deadline: time.monotonic() value after which the search raises TimeoutError.
+        :return: The score of the move for the AI (at most alpha if it does not beat alpha).
         """
-        board[row][col] = piece
+        position, mask = ai_core.drop_piece(position, mask, heights, col)
+        # The child is scored for the player, so the AI's window (alpha, INFINITY) is negated
+        value = -ai_core.negamax(position, mask, heights, depth - 1, -INFINITY, -alpha, False,
+                                 self.transposition_table, self.killer_moves, self.move_lists,
+                                 self.stats, deadline)
+        ai_core.undo_piece(position, mask, heights, col)
+        return value
 
-    def get_best_move(self, game) -> int:
+    def search_root_parallel(self, position, mask, heights, depth, first_move, deadline) -> tuple:
+        """
+        Searches the root moves using the worker pool. The first move is searched here to get a
+        score to beat (young brothers wait), then the other moves are searched in parallel with it.
+        :param position: Bitboard of the AI's pieces at the root.
+        :param mask: Bitboard of all occupied cells at the root.
+        :param heights: Array holding the bit index of the next free cell in each column at the root.
+        :param depth: Search depth of the root.
+        :param first_move: Column to search first (the best move of the previous iteration).
+        :param deadline: time.monotonic() value after which the search raises TimeoutError.
+        :return: Tuple (best_column, score).
         """
-        Determines the best column to play for the AI using the minimax algorithm.
+        moves = np.zeros(BOARD_WIDTH, dtype=np.int64)
+        move_count = ai_core.get_valid_moves(heights, moves)
+        moves = [int(col) for col in moves[:move_count]]
+        if ai_core.transposition_key(position, mask)[2]:
+            # Moves right of the center mirror the ones left of it
+            moves = [col for col in moves if col <= BOARD_WIDTH // 2]
+        if first_move in moves:
+            moves.remove(first_move)
+            moves.insert(0, first_move)
+
+        best_move = moves[0]
+        best_value = self.search_move(position, mask, heights, best_move, depth, -INFINITY, deadline)
+        futures = {self.pool.submit(search_move_in_worker, self.search_id, position, mask, heights,
+                                    col, depth, best_value, deadline): col
+                   for col in moves[1:]}
+        try:
+            for future in as_completed(futures):
+                value = future.result()
+                if value > best_value:
+                    best_move, best_value = futures[future], value
+        finally:
+            for future in futures:
+                future.cancel()
+        return best_move, best_value
+
+    def get_best_move(self, game, time_budget=2.0) -> int:
+        """
+        Determines the best column to play for the AI using iterative deepening: the minimax
+        search is repeated with depth 1, 2, ... up to self.depth until the time budget runs out.
+        The transposition table is kept between iterations, so each search orders its moves
+        using the results of the previous, shallower one. Openings in the book skip the search.
         :param game: Object representing the current game state, which includes the board.
+        :param time_budget: Seconds the search may take, or None to always search to full depth.
         :return: Integer representing the best column index for the AI to play.
         """
-        board = game.board.copy()
-        move, _ = self.minimax(board, self.depth, -math.inf, math.inf, True)
-        return move
+        position, mask, heights = self.board_to_bitboards(game.board)
+        if self.use_book:
+            book_move = get_book_move(position, mask)
+            if book_move != -1:
+                return book_move
+
+        self.reset_search_tables()
+        self.search_id += 1
+        deadline = np.inf if time_budget is None else time.monotonic() + time_budget
+
+        # Fallback in case not even the depth 1 search finishes in time
+        valid_moves = self.move_lists[0]
+        move_count = ai_core.get_valid_moves(heights, valid_moves)
+        best_move = int(valid_moves[0]) if move_count else None
+
+        # Immediate wins and forced blocks are settled by the first, sequential iterations
+        parallel = (self.pool is not None and ai_core.find_winning_move(position, heights) == -1
+                    and ai_core.find_winning_move(position ^ mask, heights) == -1)
+        try:
+            for depth in range(1, self.depth + 1):
+                value = None
+                if parallel and depth >= PARALLEL_MIN_DEPTH:
+                    try:
+                        best_move, value = self.search_root_parallel(position, mask, heights, depth,
+                                                                     best_move, deadline)
+                    except BrokenProcessPool:
+                        # A worker died; search this and the remaining depths in this process
+                        self.close()
+                        parallel = False
+                if value is None:
+                    value = ai_core.negamax(position, mask, heights, depth, -INFINITY, INFINITY, True,
+                                            self.transposition_table, self.killer_moves, self.move_lists,
+                                            self.stats, deadline)
+                    stored_move = int(ai_core.get_stored_move(self.transposition_table, position, mask))
+                    if stored_move != -1:
+                        best_move = stored_move
+                if abs(value) >= WIN_SCORE:
+                    break
+        except TimeoutError:
+            pass  # Keep the move from the deepest search that finished
+        return best_move
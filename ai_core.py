@@ -0,0 +1,469 @@
+import time
+import numpy as np
+from numba import njit, objmode
+from constants import *
+
+# Search functions used by Connect4AI, compiled to native code with Numba.
+#
+# Board state is a pair of bitboards: mask holds every occupied cell and position holds the
+# cells of the side to move, plus a heights array giving the bit index of the next free cell
+# in each column. Module-level constants are frozen into the compiled code.
+
+# Bitboard layout: every column takes BOARD_HEIGHT + 1 bits, counted from the bottom cell upward.
+# The extra (sentinel) bit on top of each column is never set, so the shift-and-AND win checks
+# cannot wrap a line of pieces from one column into the next.
+COLUMN_STRIDE = BOARD_HEIGHT + 1
+
+# Bit mask with every playable cell set (the sentinel row is left out)
+FULL_MASK = sum(((1 << BOARD_HEIGHT) - 1) << (col * COLUMN_STRIDE) for col in range(BOARD_WIDTH))
+
+# Bit mask of the center column, used by the evaluation heuristic
+CENTER_MASK = ((1 << BOARD_HEIGHT) - 1) << (BOARD_WIDTH // 2 * COLUMN_STRIDE)
+
+# Bit distance between neighbouring cells of a line: vertical, horizontal and the two diagonals
+DIRECTION_SHIFTS = (1, COLUMN_STRIDE, COLUMN_STRIDE - 1, COLUMN_STRIDE + 1)
+
+# Bit mask of the cells of the first column (sentinel included)
+COLUMN_MASK = (1 << COLUMN_STRIDE) - 1
+
+# Columns sorted by distance from the center, where the strongest moves usually are
+MOVE_ORDER = tuple(sorted(range(BOARD_WIDTH), key=lambda col: abs(col - BOARD_WIDTH // 2)))
+
+# Deepest search that can be requested (one ply per empty cell)
+MAX_DEPTH = BOARD_WIDTH * BOARD_HEIGHT
+
+# Transposition table size (a prime, so keys spread over every slot) and entry bound flags
+TT_SIZE = 1048583
+TT_EXACT = 0   # The stored value is the exact minimax value
+TT_LOWER = 1   # The search failed high; the true value is at least the stored value
+TT_UPPER = 2   # The search failed low; the true value is at most the stored value
+TT_DTYPE = np.dtype([("key", np.int64), ("value", np.int32),
+                     ("depth", np.int8), ("flag", np.int8), ("move", np.int8)])
+
+# Score of a won position; anything this large means the search found a forced result
+WIN_SCORE = 100000000
+INFINITY = 2 * WIN_SCORE
+
+# Outcomes reported by classify_node
+NONTERMINAL = 0
+TERMINAL_LOSS = 1   # The side to move has lost
+TERMINAL_DRAW = 2
+
+# The clock is read once per this many nodes, since leaving compiled code to read it is slow
+DEADLINE_CHECK_INTERVAL = 1024
+
+# Null-move pruning: depth reduction of the null-move search, and the fewest empty cells a node
+# needs to try it (near the end of the game passing would often be better than any real move)
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_EMPTY = 16
+
+# Added to the transposition key when the player is to move. Null moves let the same pieces occur
+# with either side to move, and the evaluation depends on which side is the AI.
+PLAYER_TO_MOVE_KEY = 1 << 62
+
+
+def new_transposition_table() -> np.ndarray:
+    """
+    Allocates an empty transposition table.
+    :return: A structured array of TT_SIZE entries, all marked as empty.
+    """
+    table = np.zeros(TT_SIZE, dtype=TT_DTYPE)
+    clear_transposition_table(table)
+    return table
+
+
+def clear_transposition_table(table) -> None:
+    """
+    Marks every entry of a transposition table as empty.
+    :param table: Transposition table created by new_transposition_table.
+    :return: None
+    """
+    table["key"].fill(-1)
+    table["depth"].fill(-1)  # Any result may replace an empty entry
+
+
+@njit(cache=True)
+def popcount(bitboard) -> int:
+    """
+    Counts the set bits of a bitboard.
+    :param bitboard: Integer bitboard.
+    :return: The number of set bits.
+    """
+    count = 0
+    while bitboard:
+        bitboard &= bitboard - 1
+        count += 1
+    return count
+
+
+@njit(cache=True)
+def winning_move(bitboard) -> bool:
+    """
+    Checks if the given pieces contain four in a row.
+    :param bitboard: Bitboard of the pieces of a single player.
+    :return: True if the pieces contain a winning line, False otherwise.
+    """
+    for shift in DIRECTION_SHIFTS:
+        m = bitboard & (bitboard >> shift)
+        if m & (m >> (2 * shift)):
+            return True
+    return False
+
+
+@njit(cache=True)
+def classify_node(position, mask) -> int:
+    """
+    Checks if the game is over, either by a win for either player or if the board is full.
+    Only the player who made the last move can have completed four in a row, so a single
+    win check covers both players.
+    :param position: Bitboard of the pieces belonging to the side to move.
+    :param mask: Bitboard of all occupied cells.
+    :return: TERMINAL_LOSS, TERMINAL_DRAW or NONTERMINAL.
+    """
+    if winning_move(position ^ mask):
+        return TERMINAL_LOSS
+    if mask == FULL_MASK:
+        return TERMINAL_DRAW
+    return NONTERMINAL
+
+
+@njit(cache=True)
+def score_position(bitboard, opp_bitboard) -> int:
+    """
+    Scores the current board position for the specified player. Every window of four cells
+    is rated (+100 for four pieces, +5 for three and an empty cell, +2 for two and two empty
+    cells, -4 for three opponent pieces and an empty cell), plus 3 per piece in the center column.
+    All windows of one direction are rated at once: shifting the bitboards by 0 to 3 steps
+    lines the four cells of each window up on the bit of its first cell. This is faster than
+    looping over a precomputed table of the 69 window masks with a score lookup, and several
+    times faster than encoding each window in base 3 for an 81-entry score table.
+    :param bitboard: Bitboard of the pieces of the player to score.
+    :param opp_bitboard: Bitboard of the opponent's pieces.
+    :return: An integer score representing the board position for the player.
+    """
+    # Sentinel bits are neither pieces nor empty, so windows leaving the board never match
+    empty = FULL_MASK & ~(bitboard | opp_bitboard)
+    fours = threes = twos = opp_threes = 0
+
+    for shift in DIRECTION_SHIFTS:
+        p0, p1, p2, p3 = bitboard, bitboard >> shift, bitboard >> 2 * shift, bitboard >> 3 * shift
+        e0, e1, e2, e3 = empty, empty >> shift, empty >> 2 * shift, empty >> 3 * shift
+        o0, o1, o2, o3 = opp_bitboard, opp_bitboard >> shift, opp_bitboard >> 2 * shift, opp_bitboard >> 3 * shift
+
+        # Windows are split in two halves of two cells each
+        p01, p23, o01, o23 = p0 & p1, p2 & p3, o0 & o1, o2 & o3
+        p_e01, p_e23 = p0 & e1 | e0 & p1, p2 & e3 | e2 & p3  # One piece, one empty cell
+        o_e01, o_e23 = o0 & e1 | e0 & o1, o2 & e3 | e2 & o3
+
+        fours += popcount(p01 & p23)
+        threes += popcount(p01 & p_e23 | p_e01 & p23)
+        twos += popcount(p01 & e2 & e3 | e0 & e1 & p23 | p_e01 & p_e23)
+        opp_threes += popcount(o01 & o_e23 | o_e01 & o23)
+
+    score = fours * 100 + threes * 5 + twos * 2 - opp_threes * 4
+
+    # Score center column
+    score += popcount(bitboard & CENTER_MASK) * 3
+
+    return score
+
+
+@njit(cache=True)
+def get_next_open_row(heights, col) -> int:
+    """
+    Finds the next available cell in the specified column where a piece can be dropped.
+    :param heights: Array holding the bit index of the next free cell in each column.
+    :param col: Integer representing the column to check for the next open cell.
+    :return: Integer bit index of the next available cell, or -1 if the column is full.
+    """
+    if heights[col] < col * COLUMN_STRIDE + BOARD_HEIGHT:
+        return heights[col]
+    return -1
+
+
+@njit(cache=True)
+def get_valid_moves(heights, moves) -> int:
+    """
+    Writes the valid columns where a piece can be dropped, in center-first order.
+    :param heights: Array holding the bit index of the next free cell in each column.
+    :param moves: Array of at least BOARD_WIDTH elements that receives the columns.
+    :return: The number of valid columns written to the start of moves.
+    """
+    count = 0
+    for col in MOVE_ORDER:
+        if get_next_open_row(heights, col) != -1:
+            moves[count] = col
+            count += 1
+    return count
+
+
+@njit(cache=True)
+def order_moves(moves, count, tt_move, killer_move) -> None:
+    """
+    Reorders the valid moves in place for the search: the transposition table's best move first,
+    then the killer move, then the remaining moves in center-first order.
+    :param moves: Array whose first count elements are the valid columns in center-first order.
+    :param count: Number of valid columns in moves.
+    :param tt_move: Best column stored in the transposition table, or -1.
+    :param killer_move: Column that last caused a beta cutoff at this depth, or -1.
+    :return: None
+    """
+    first = 0
+    for preferred in (tt_move, killer_move):
+        for i in range(first, count):
+            if moves[i] == preferred:
+                for j in range(i, first, -1):
+                    moves[j] = moves[j - 1]
+                moves[first] = preferred
+                first += 1
+                break
+
+
+@njit(cache=True)
+def find_winning_move(bitboard, heights) -> int:
+    """
+    Finds a column where the given player completes four in a row with their next piece.
+    :param bitboard: Bitboard of the pieces of a single player.
+    :param heights: Array holding the bit index of the next free cell in each column.
+    :return: The first such column in center-first order, or -1 if there is none.
+    """
+    for col in MOVE_ORDER:
+        cell = get_next_open_row(heights, col)
+        if cell != -1 and winning_move(bitboard | (1 << cell)):
+            return col
+    return -1
+
+
+@njit(cache=True)
+def mirror_bitboard(bitboard) -> int:
+    """
+    Mirrors a bitboard left to right. Since position + mask never carries from one column into
+    the next, this also mirrors a position key.
+    :param bitboard: Integer bitboard (or position key).
+    :return: The bitboard with column c moved to column BOARD_WIDTH - 1 - c.
+    """
+    mirrored = 0
+    for col in range(BOARD_WIDTH):
+        column_bits = (bitboard >> (col * COLUMN_STRIDE)) & COLUMN_MASK
+        mirrored |= column_bits << ((BOARD_WIDTH - 1 - col) * COLUMN_STRIDE)
+    return mirrored
+
+
+@njit(cache=True)
+def transposition_key(position, mask) -> tuple:
+    """
+    Computes the key a position is stored under in the transposition table. A position and its
+    mirror image have the same value, so both share the smaller of their two keys.
+    :param position: Bitboard of the pieces belonging to the side to move.
+    :param mask: Bitboard of all occupied cells.
+    :return: Tuple (key, mirrored, symmetric): mirrored tells whether the key is that of the mirror
+             image (so stored columns must be mirrored), symmetric whether the position is its own mirror.
+    """
+    # position + mask identifies a position uniquely, since mask fixes every column's height
+    key = position + mask
+    mirror_key = mirror_bitboard(key)
+    if mirror_key < key:
+        return mirror_key, True, False
+    return key, False, mirror_key == key
+
+
+@njit(cache=True)
+def drop_piece(position, mask, heights, col) -> tuple:
+    """
+    Plays a piece for the side to move in the specified column. The move is undone with undo_piece.
+    :param position: Bitboard of the pieces belonging to the side to move.
+    :param mask: Bitboard of all occupied cells.
+    :param heights: Array holding the bit index of the next free cell in each column (updated in place).
+    :param col: Integer representing the column index to place the piece.
+    :return: Tuple (position, mask) after the move, with position now holding the opponent's pieces.
+    """
+    position ^= mask
+    mask |= 1 << heights[col]
+    heights[col] += 1
+    return position, mask
+
+
+@njit(cache=True)
+def undo_piece(position, mask, heights, col) -> tuple:
+    """
+    Takes back the last piece played in the specified column by drop_piece.
+    :param position: Bitboard of the pieces belonging to the side to move.
+    :param mask: Bitboard of all occupied cells.
+    :param heights: Array holding the bit index of the next free cell in each column (updated in place).
+    :param col: Integer representing the column index the piece was placed in.
+    :return: Tuple (position, mask) as they were before the move.
+    """
+    heights[col] -= 1
+    mask ^= 1 << heights[col]
+    position ^= mask
+    return position, mask
+
+
+@njit(cache=True)
+def store_transposition(entry, key, depth, value, flag, best_move) -> None:
+    """
+    Stores a search result in a transposition table entry. An entry searched to a greater depth
+    is kept over a shallower result for a different position that hashes to the same slot.
+    :param entry: The table entry for the position (table[key % TT_SIZE]).
+    :param key: Key of the position, from transposition_key.
+    :param depth: Remaining search depth the value was computed with.
+    :param value: Score found for the position.
+    :param flag: TT_EXACT, TT_LOWER or TT_UPPER, depending on how the score relates to the window.
+    :param best_move: Column that produced the score.
+    :return: None
+    """
+    if entry["key"] == key or entry["depth"] <= depth:
+        entry["key"] = key
+        entry["depth"] = depth
+        entry["value"] = value
+        entry["flag"] = flag
+        entry["move"] = best_move
+
+
+@njit(cache=True)
+def negamax(position, mask, heights, depth, alpha, beta, ai_to_move,
+            table, killer_moves, move_lists, stats, deadline) -> int:
+    """
+    The Minimax algorithm with alpha-beta pruning in negamax form: scores are always from the
+    point of view of the side to move, so a child's score is negated for its parent.
+    Moves are searched as a principal variation search: the first (best ordered) move gets the
+    full window, the others a null window that only tells whether they beat it, and only those
+    that do are searched again with the full window.
+    Only the score is returned; the best column of every searched node (including the root)
+    is recorded in the transposition table, where get_stored_move reads it back.
+    :param position: Bitboard of the pieces belonging to the side to move.
+    :param mask: Bitboard of all occupied cells.
+    :param heights: Array holding the bit index of the next free cell in each column.
+    :param depth: Integer representing the remaining depth to explore in the game tree.
+    :param alpha: Score the side to move is already guaranteed elsewhere in the tree.
+    :param beta: Score the opponent is already guaranteed elsewhere in the tree, negated.
+    :param ai_to_move: Boolean indicating whether the current turn is the AI's (True) or the player's (False).
+    :param table: Transposition table created by new_transposition_table.
+    :param killer_moves: Array holding the killer move (or -1) for each remaining depth.
+    :param move_lists: 2D array with a row of BOARD_WIDTH columns per remaining depth, used as the
+                       move list of the node being searched at that depth so no node allocates one.
+    :param stats: Array whose first element counts the searched nodes.
+    :param deadline: time.monotonic() value after which the search raises TimeoutError.
+    :return: The score of the position for the side to move.
+    """
+    stats[0] += 1
+    if stats[0] % DEADLINE_CHECK_INTERVAL == 0:
+        with objmode(now="float64"):
+            now = time.monotonic()
+        if now > deadline:
+            raise TimeoutError()
+
+    outcome = classify_node(position, mask)
+    if outcome == TERMINAL_LOSS:
+        return -WIN_SCORE
+    elif outcome == TERMINAL_DRAW:
+        return 0
+    elif depth == 0:
+        # The evaluation rates the board for the AI
+        if ai_to_move:
+            return score_position(position, position ^ mask)
+        return -score_position(position ^ mask, position)
+
+    key, mirrored, symmetric = transposition_key(position, mask)
+    if not ai_to_move:
+        key |= PLAYER_TO_MOVE_KEY
+    entry = table[key % TT_SIZE]
+
+    # The side to move wins at once if it can; there is nothing left to search
+    win_col = find_winning_move(position, heights)
+    if win_col != -1:
+        store_transposition(entry, key, depth, WIN_SCORE, TT_EXACT, BOARD_WIDTH - 1 - win_col if mirrored else win_col)
+        return WIN_SCORE
+
+    alpha_orig = alpha
+    tt_move = -1
+    if entry["key"] == key:
+        tt_move = BOARD_WIDTH - 1 - entry["move"] if mirrored else entry["move"]
+        if entry["depth"] >= depth:
+            tt_value = entry["value"]
+            if entry["flag"] == TT_EXACT:
+                return tt_value
+            elif entry["flag"] == TT_LOWER:
+                alpha = max(alpha, tt_value)
+            else:
+                beta = min(beta, tt_value)
+            if alpha >= beta:
+                return tt_value
+
+    valid_moves = move_lists[depth]
+    block_col = find_winning_move(position ^ mask, heights)
+    if block_col != -1:
+        # The opponent wins next move unless that cell is taken, so no other move needs searching
+        valid_moves[0] = block_col
+        move_count = 1
+    else:
+        if (depth >= NULL_MOVE_REDUCTION + 1 and beta - alpha == 1
+                and popcount(mask) <= BOARD_WIDTH * BOARD_HEIGHT - NULL_MOVE_MIN_EMPTY):
+            # Null move: let the opponent move twice in a row. Outside the principal variation,
+            # if a reduced search says even that fails high, a real move is assumed to as well.
+            null_score = -negamax(position ^ mask, mask, heights, depth - 1 - NULL_MOVE_REDUCTION,
+                                  -beta, -beta + 1, not ai_to_move,
+                                  table, killer_moves, move_lists, stats, deadline)
+            if null_score >= beta:
+                return beta
+        move_count = get_valid_moves(heights, valid_moves)
+        if symmetric:
+            # Moves right of the center mirror the ones left of it, so only one half is searched
+            half_count = 0
+            for i in range(move_count):
+                if valid_moves[i] <= BOARD_WIDTH // 2:
+                    valid_moves[half_count] = valid_moves[i]
+                    half_count += 1
+            move_count = half_count
+        order_moves(valid_moves, move_count, tt_move, killer_moves[depth])
+
+    column = valid_moves[0]
+    value = -INFINITY
+    for i in range(move_count):
+        col = valid_moves[i]
+        position, mask = drop_piece(position, mask, heights, col)
+        # Not a literal: Numba crashes loading a cached recursive call made with constant arguments
+        child_ai_to_move = not ai_to_move
+        if i == 0:
+            new_score = -negamax(position, mask, heights, depth - 1, -beta, -alpha, child_ai_to_move,
+                                 table, killer_moves, move_lists, stats, deadline)
+        else:
+            new_score = -negamax(position, mask, heights, depth - 1, -alpha - 1, -alpha, child_ai_to_move,
+                                 table, killer_moves, move_lists, stats, deadline)
+            if alpha < new_score < beta:
+                # The move beat the first one after all; find its exact score
+                new_score = -negamax(position, mask, heights, depth - 1, -beta, -alpha, child_ai_to_move,
+                                     table, killer_moves, move_lists, stats, deadline)
+        position, mask = undo_piece(position, mask, heights, col)
+        if new_score > value:
+            value = new_score
+            column = col
+        alpha = max(alpha, value)
+        if alpha >= beta:
+            killer_moves[depth] = col
+            break
+
+    if value <= alpha_orig:
+        flag = TT_UPPER
+    elif value >= beta:
+        flag = TT_LOWER
+    else:
+        flag = TT_EXACT
+    store_transposition(entry, key, depth, value, flag, BOARD_WIDTH - 1 - column if mirrored else column)
+    return value
+
+
+@njit(cache=True)
+def get_stored_move(table, position, mask) -> int:
+    """
+    Reads the best column recorded for a position in the transposition table.
+    :param table: Transposition table created by new_transposition_table.
+    :param position: Bitboard of the AI's pieces, with the AI to move.
+    :param mask: Bitboard of all occupied cells.
+    :return: The stored column, or -1 if the position is not in the table.
+    """
+    key, mirrored, _ = transposition_key(position, mask)
+    entry = table[key % TT_SIZE]
+    if entry["key"] != key:
+        return -1
+    return BOARD_WIDTH - 1 - entry["move"] if mirrored else entry["move"]
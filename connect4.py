@@ -1,6 +1,14 @@
-import numpy as np
+import array
 from constants import *
 
+# Windows of four cells in the flat board, as (index step, start rows, start columns)
+WINDOW_DIRECTIONS = (
+    (1, range(BOARD_HEIGHT), range(BOARD_WIDTH - 3)),                    # Horizontal
+    (BOARD_WIDTH, range(BOARD_HEIGHT - 3), range(BOARD_WIDTH)),          # Vertical
+    (BOARD_WIDTH + 1, range(BOARD_HEIGHT - 3), range(BOARD_WIDTH - 3)),  # Positive diagonal
+    (1 - BOARD_WIDTH, range(3, BOARD_HEIGHT), range(BOARD_WIDTH - 3)),   # Negative diagonal
+)
+
 class Connect4:
     """
     Connect4 game logic class that manages the game state, board, and player turns.
@@ -11,9 +19,10 @@ class Connect4:
         """
         Initializes the Connect4 game with an empty board, sets the game state,
         and defines the starting player.
+        The board is stored row by row in a flat array of bytes (row 0 is the top row).
         :return: None
         """
-        self.board = np.zeros((BOARD_HEIGHT, BOARD_WIDTH), dtype=int)
+        self.board = array.array('b', [EMPTY] * (BOARD_HEIGHT * BOARD_WIDTH))
         self.game_over = False
         self.turn = PLAYER_PIECE
         self.winner = None
@@ -23,7 +32,7 @@ class Connect4:
         Resets the game state to start a new game.
         :return: None
         """
-        self.board = np.zeros((BOARD_HEIGHT, BOARD_WIDTH), dtype=int)
+        self.board = array.array('b', [EMPTY] * (BOARD_HEIGHT * BOARD_WIDTH))
         self.game_over = False
         self.winner = None
         self.turn = PLAYER_PIECE
@@ -36,7 +45,16 @@ class Connect4:
         :param piece: The piece to be placed (PLAYER_PIECE or AI_PIECE).
         :return: None
         """
-        self.board[row][col] = piece
+        self.board[row * BOARD_WIDTH + col] = piece
+
+    def get(self, row, col) -> int:
+        """
+        Returns the contents of a cell of the board.
+        :param row: The row index of the cell (row 0 is the top row).
+        :param col: The column index of the cell.
+        :return: EMPTY, PLAYER_PIECE or AI_PIECE.
+        """
+        return self.board[row * BOARD_WIDTH + col]
 
     def is_valid_location(self, col) -> bool:
         """
@@ -44,7 +62,7 @@ class Connect4:
         :param col: The column index to check for validity.
         :return: True if the column is valid (not full), False otherwise.
         """
-        return self.board[0][col] == EMPTY
+        return self.board[col] == EMPTY
 
     def get_next_open_row(self, col) -> int:
         """
@@ -53,7 +71,7 @@ class Connect4:
         :return: The row index of the next open row, or -1 if no open row exists.
         """
         for row in range(BOARD_HEIGHT - 1, -1, -1):
-            if self.board[row][col] == EMPTY:
+            if self.board[row * BOARD_WIDTH + col] == EMPTY:
                 return row
         return -1
 
@@ -63,30 +81,13 @@ class Connect4:
         :param piece: The piece to check for a winning move (PLAYER_PIECE or AI_PIECE).
         :return: True if the piece has a winning move, False otherwise.
         """
-        # Check horizontal
-        for row in range(BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH - 3):
-                if all(self.board[row][col + i] == piece for i in range(WINDOW_LENGTH)):
-                    return True
-
-        # Check vertical
-        for col in range(BOARD_WIDTH):
-            for row in range(BOARD_HEIGHT - 3):
-                if all(self.board[row + i][col] == piece for i in range(WINDOW_LENGTH)):
-                    return True
-
-        # Check positive diagonals
-        for row in range(BOARD_HEIGHT - 3):
-            for col in range(BOARD_WIDTH - 3):
-                if all(self.board[row + i][col + i] == piece for i in range(WINDOW_LENGTH)):
-                    return True
-
-        # Check negative diagonals
-        for row in range(3, BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH - 3):
-                if all(self.board[row - i][col + i] == piece for i in range(WINDOW_LENGTH)):
-                    return True
-
+        board = self.board
+        for step, rows, cols in WINDOW_DIRECTIONS:
+            for row in rows:
+                for col in cols:
+                    start = row * BOARD_WIDTH + col
+                    if all(board[start + i * step] == piece for i in range(WINDOW_LENGTH)):
+                        return True
         return False
 
     def is_board_full(self) -> bool:
@@ -94,7 +95,7 @@ class Connect4:
         Checks if the board is full (no more valid moves available).
         :return: True if the board is full, False otherwise.
         """
-        return all(self.board[0][col] != EMPTY for col in range(BOARD_WIDTH))
+        return all(self.board[col] != EMPTY for col in range(BOARD_WIDTH))
 
     def play_move(self, col) -> bool:
         """
@@ -50,12 +50,12 @@ class Connect4GUI:
         # Draw the pieces - Flipped to show board right-side up
         for col in range(BOARD_WIDTH):
             for row in range(BOARD_HEIGHT):
-                if self.game.board[row][col] == PLAYER_PIECE:
+                if self.game.get(row, col) == PLAYER_PIECE:
                     pygame.draw.circle(self.screen, RED,
                                        (col * SQUARE_SIZE + SQUARE_SIZE // 2,
                                         (row + 1) * SQUARE_SIZE + SQUARE_SIZE // 2),
                                        RADIUS)
-                elif self.game.board[row][col] == AI_PIECE:
+                elif self.game.get(row, col) == AI_PIECE:
                     pygame.draw.circle(self.screen, YELLOW,
                                        (col * SQUARE_SIZE + SQUARE_SIZE // 2,
                                         (row + 1) * SQUARE_SIZE + SQUARE_SIZE // 2),
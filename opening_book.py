@@ -0,0 +1,97 @@
+from constants import *
+from ai_core import drop_piece, transposition_key, COLUMN_STRIDE
+import numpy as np
+
+# Depth of the search that chose the book moves, well beyond what the game searches in play
+BOOK_DEPTH = 20
+
+# Best AI reply after each opening, as the columns played so far (the player moves first).
+# Mirror images and transpositions of a listed opening are left out. Regenerate by running this module.
+BOOK_LINES = {
+    "0": 3, "030": 3, "031": 3, "032": 3, "033": 3, "034": 3, "035": 3, "036": 3,
+    "1": 3, "131": 3, "132": 3, "133": 3, "134": 3, "135": 3,
+    "2": 3, "232": 2, "233": 3, "234": 3,
+    "3": 3, "330": 3, "331": 2, "332": 1, "333": 3,
+}
+
+
+def replay_moves(moves) -> tuple:
+    """
+    Plays a sequence of columns from the empty board.
+    :param moves: String of column digits, starting with the player's first move.
+    :return: Tuple (position, mask, heights) with position holding the pieces of the side to move.
+    """
+    position, mask = 0, 0
+    heights = np.arange(BOARD_WIDTH, dtype=np.int64) * COLUMN_STRIDE
+    for col in moves:
+        position, mask = drop_piece(position, mask, heights, int(col))
+    return position, mask, heights
+
+
+def build_opening_book(lines) -> dict:
+    """
+    Converts opening lines to a dictionary keyed like the transposition table, so mirror-image
+    openings and openings reached through a different move order share an entry.
+    :param lines: Dictionary mapping a string of column digits to the best column to play next.
+    :return: Dictionary mapping a transposition key to the best column in the canonical orientation.
+    """
+    book = {}
+    for moves, col in lines.items():
+        position, mask, _ = replay_moves(moves)
+        key, mirrored, _ = transposition_key(position, mask)
+        book[key] = BOARD_WIDTH - 1 - col if mirrored else col
+    return book
+
+
+OPENING_BOOK = build_opening_book(BOOK_LINES)
+
+
+def get_book_move(position, mask) -> int:
+    """
+    Looks up the best move of a position in the opening book.
+    :param position: Bitboard of the pieces belonging to the side to move.
+    :param mask: Bitboard of all occupied cells.
+    :return: The column to play, or -1 if the position is not in the book.
+    """
+    key, mirrored, _ = transposition_key(position, mask)
+    col = OPENING_BOOK.get(key, -1)
+    if col == -1 or not mirrored:
+        return col
+    return BOARD_WIDTH - 1 - col
+
+
+def generate_book_lines() -> dict:
+    """
+    Computes the book: the AI's reply to every first move, and to every second player move
+    after that reply, searched to BOOK_DEPTH. This takes a few minutes.
+    :return: Dictionary in the format of BOOK_LINES.
+    """
+    from ai import Connect4AI
+    from connect4 import Connect4
+
+    ai = Connect4AI(depth=BOOK_DEPTH, workers=1, use_book=False)
+    lines = {}
+    seen = set()
+
+    def add_line(moves) -> int:
+        position, mask, _ = replay_moves(moves)
+        key = transposition_key(position, mask)[0]
+        if key in seen:
+            return -1
+        seen.add(key)
+        game = Connect4()
+        for col in moves:
+            game.play_move(int(col))
+        lines[moves] = ai.get_best_move(game, time_budget=None)
+        print(f"{moves!r}: {lines[moves]},")
+        return lines[moves]
+
+    for first in range(BOARD_WIDTH // 2 + 1):
+        reply = add_line(str(first))
+        for second in range(BOARD_WIDTH):
+            add_line(f"{first}{reply}{second}")
+    return lines
+
+
+if __name__ == "__main__":
+    generate_book_lines()